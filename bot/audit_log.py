@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+CURRENT_NAME = "audit.jsonl"
+ARCHIVE_PREFIX = "audit-"
+ARCHIVE_SUFFIX = ".jsonl.gz"
+STAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+_STOP = object()
+
+
+class AuditLog:
+    def __init__(self, directory, max_bytes=10 * 1024 * 1024, rotate_seconds=24 * 60 * 60,
+                 queue_size=10000, batch_size=500):
+        self.directory = directory
+        self.path = os.path.join(directory, CURRENT_NAME)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.batch_size = batch_size
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._task = None
+        self._file = None
+        self._size = 0
+        self._opened_at = None
+        self._compressing = set()
+        self._stopping = False
+
+    def write(self, record):
+        # Горячий путь: только кладём запись в очередь, диск трогает фоновая задача
+        if self._task is not None and self._task.done():
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.error(f"Очередь аудит-лога переполнена, потеряно записей: {self.dropped}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Запись аудит-лога остановлена из-за ошибки: {task.exception()!r}")
+
+    async def close(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+
+        if not task.done():
+            try:
+                self.queue.put_nowait(_STOP)
+            except asyncio.QueueFull:
+                # Очередь полна, значит запись идёт: дописываем её до конца и выходим
+                self._stopping = True
+        try:
+            await task
+        except Exception:
+            pass  # уже залогировано в _on_done
+
+        if self._compressing:
+            await asyncio.gather(*self._compressing)
+
+    async def _run(self):
+        try:
+            await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+            await self._open()
+        except Exception as e:
+            logger.error(f"Не удалось открыть аудит-лог {self.path}, запись отключена: {e}")
+            return
+
+        try:
+            while True:
+                item = await self.queue.get()
+                batch = []
+                stop = item is _STOP
+                if not stop:
+                    batch.append(item)
+                while not stop and len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                    else:
+                        batch.append(item)
+
+                if batch:
+                    try:
+                        await self._write_batch(batch)
+                    except Exception as e:
+                        logger.error(f"Не удалось записать аудит-лог: {e}")
+
+                if stop or (self._stopping and self.queue.empty()):
+                    break
+        finally:
+            if self._file is not None:
+                await self._file.close()
+                self._file = None
+
+    async def _write_batch(self, batch):
+        if self._file is None:
+            # Предыдущее открытие после ротации не удалось, пробуем снова
+            await self._open()
+        elif self._should_rotate():
+            await self._rotate()
+
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch
+        )
+        await self._file.write(data)
+        await self._file.flush()
+        self._size += len(data.encode("utf-8"))
+
+    def _should_rotate(self):
+        if self._size == 0:
+            return False
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        if self.rotate_seconds and time.time() - self._opened_at >= self.rotate_seconds:
+            return True
+        return False
+
+    async def _open(self):
+        self._size, self._opened_at = await asyncio.to_thread(_current_file_state, self.path)
+        self._file = await aiofiles.open(self.path, "a", encoding="utf-8")
+
+    async def _rotate(self):
+        await self._file.close()
+        self._file = None
+
+        started = datetime.fromtimestamp(self._opened_at).strftime(STAMP_FORMAT)
+        finished = datetime.now().strftime(STAMP_FORMAT)
+        pending = await asyncio.to_thread(
+            _move_to_archive, self.path, self.directory, f"{ARCHIVE_PREFIX}{started}_{finished}"
+        )
+        # Сжатие идёт в фоне и не задерживает запись новых событий
+        task = asyncio.create_task(_compress(pending, pending + ".gz"))
+        self._compressing.add(task)
+        task.add_done_callback(self._compressing.discard)
+        await self._open()
+
+
+def _current_file_state(path):
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return 0, time.time()
+
+    opened_at = time.time()
+    if size:
+        try:
+            with open(path, encoding="utf-8") as f:
+                first = json.loads(f.readline())
+            opened_at = datetime.fromisoformat(first["ts"]).timestamp()
+        except Exception:
+            opened_at = os.path.getmtime(path)
+    return size, opened_at
+
+
+def _move_to_archive(path, directory, base):
+    # Несколько ротаций за одну секунду получают суффиксы .1, .2, ...
+    name, counter = base, 0
+    while (os.path.exists(os.path.join(directory, name + ".jsonl"))
+           or os.path.exists(os.path.join(directory, name + ARCHIVE_SUFFIX))):
+        counter += 1
+        name = f"{base}.{counter}"
+    pending = os.path.join(directory, name + ".jsonl")
+    os.replace(path, pending)
+    return pending
+
+
+def _gzip_file(source, target):
+    with open(source, "rb") as src, gzip.open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+async def _compress(source, target):
+    try:
+        await asyncio.to_thread(_gzip_file, source, target)
+    except Exception as e:
+        logger.error(f"Не удалось сжать архив аудит-лога {source}: {e}")
+
+
+def _archive_bounds(name):
+    stem = name[len(ARCHIVE_PREFIX):].split(".", 1)[0]
+    try:
+        started, finished = stem.split("_")
+        return (datetime.strptime(started, STAMP_FORMAT),
+                datetime.strptime(finished, STAMP_FORMAT))
+    except ValueError:
+        return None, None
+
+
+def _archive_order(name):
+    parts = name[len(ARCHIVE_PREFIX):].split(".")
+    counter = int(parts[1]) if parts[1].isdigit() else 0
+    return parts[0], counter
+
+
+def iter_log_files(directory, since=None, until=None):
+    names = {
+        name for name in os.listdir(directory)
+        if name.startswith(ARCHIVE_PREFIX) and name.endswith((".jsonl", ARCHIVE_SUFFIX))
+    }
+    for name in sorted(names, key=_archive_order):
+        if name.endswith(ARCHIVE_SUFFIX) and name[:-len(".gz")] in names:
+            # Архив ещё сжимается, читаем несжатый исходник
+            continue
+        started, finished = _archive_bounds(name)
+        if since and finished and finished < since.replace(microsecond=0):
+            continue
+        if until and started and started > until:
+            continue
+        yield os.path.join(directory, name)
+
+    current = os.path.join(directory, CURRENT_NAME)
+    if os.path.exists(current):
+        yield current
+
+
+def iter_records(directory, user_id=None, operator=None, since=None, until=None, log_type=None,
+                 tenant=None):
+    for path in iter_log_files(directory, since, until):
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            f = opener(path, "rt", encoding="utf-8")
+        except FileNotFoundError:
+            # Файл мог быть сжат или переименован во время чтения
+            continue
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                if user_id is not None and str(record.get("user_id")) != user_id:
+                    continue
+                if operator is not None and operator not in (
+                    str(record.get("operator_id")), record.get("operator_username")
+                ):
+                    continue
+                if log_type is not None and record.get("type") != log_type:
+                    continue
+                if tenant is not None and record.get("tenant") != tenant:
+                    continue
+                if since or until:
+                    try:
+                        ts = datetime.fromisoformat(record["ts"])
+                    except (KeyError, ValueError):
+                        continue
+                    if since and ts < since:
+                        continue
+                    if until and ts > until:
+                        continue
+
+                yield record
+
+
+def _parse_time(value):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"неверный формат времени: {value}")
+    # В записях время локальное без часового пояса, приводим к нему же
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def main(argv=None):
+    default_dir = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "audit"
+    )
+    parser = argparse.ArgumentParser(description="Поиск по аудит-логу бота (JSONL)")
+    parser.add_argument("--dir", default=os.getenv("AUDIT_LOG_DIR", default_dir),
+                        help="каталог с аудит-логом")
+    parser.add_argument("--user-id", help="ID пользователя")
+    parser.add_argument("--operator", help="ID или username оператора")
+    parser.add_argument("--type", dest="log_type", help="тип события, например USER_ACTION")
+    parser.add_argument("--tenant", help="имя бота из TENANTS_FILE")
+    parser.add_argument("--since", type=_parse_time,
+                        help="начало интервала, ISO-формат (2025-01-31 или 2025-01-31T12:00:00)")
+    parser.add_argument("--until", type=_parse_time,
+                        help="конец интервала, ISO-формат")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.dir):
+        parser.error(f"каталог {args.dir} не найден")
+
+    records = iter_records(args.dir, args.user_id, args.operator,
+                           args.since, args.until, args.log_type, args.tenant)
+    try:
+        for record in records:
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,18 @@ import sqlite3
 from datetime import datetime
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import FSInputFile
 import re
 import sys
+import html
+from audit_log import AuditLog
+from loop_watchdog import LoopWatchdog
+from tenants import Tenant, load_tenants
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -23,28 +28,54 @@ ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
 
 load_dotenv(ENV_PATH)
 
-DEFAULT_BOT_TOKEN = "DEFAULT_BOT_TOKEN"
-DEFAULT_OPERATORS = "DEFAULT_OPERATORS"
-DEFAULT_FILES_CHANNEL_ID = "DEFAULT_FILES_CHANNEL_ID"
-DEFAULT_LOG_CHANNEL_ID = "DEFAULT_LOG_CHANNEL_ID"
-
-API_TOKEN = os.getenv("BOT_TOKEN", DEFAULT_BOT_TOKEN)
-OPERATORS_STR = os.getenv("OPERATORS", DEFAULT_OPERATORS)
-OPERATORS = [int(op.strip()) for op in OPERATORS_STR.split(",") if op.strip()]
-FILES_CHANNEL_ID = int(os.getenv("FILES_CHANNEL_ID", DEFAULT_FILES_CHANNEL_ID))
-LOG_CHANNEL_ID = int(os.getenv("LOG_CHANNEL_ID", DEFAULT_LOG_CHANNEL_ID))
+TENANTS_FILE = os.getenv("TENANTS_FILE", "")
+INGEST_DEBOUNCE_SECONDS = float(os.getenv("INGEST_DEBOUNCE_SECONDS", 5))
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "0") == "1"
+LOOP_LAG_THRESHOLD_MS = int(os.getenv("LOOP_LAG_THRESHOLD_MS", 100))
+LOOP_WATCHDOG_REPORT_SECONDS = int(os.getenv("LOOP_WATCHDOG_REPORT_SECONDS", 600))
+AUDIT_LOG_DIR = os.getenv("AUDIT_LOG_DIR", os.path.join(ROOT_DIR, "data", "audit"))
+AUDIT_LOG_MAX_BYTES = int(os.getenv("AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024))
+AUDIT_LOG_ROTATE_SECONDS = int(os.getenv("AUDIT_LOG_ROTATE_SECONDS", 24 * 60 * 60))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-logger.info(f"Используется BOT_TOKEN: {API_TOKEN[:5]}...{API_TOKEN[-5:]}")
-logger.info(f"Операторы: {OPERATORS}")
-logger.info(f"ID канала файлов: {FILES_CHANNEL_ID}")
-logger.info(f"ID канала логов: {LOG_CHANNEL_ID}")
+logger.info(f"Каталог аудит-лога: {AUDIT_LOG_DIR}")
+
+# Все боты обслуживаются одним диспетчером; ключ — id бота, значение — Tenant
+TENANTS = {}
 
-bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
+audit_log = AuditLog(AUDIT_LOG_DIR, AUDIT_LOG_MAX_BYTES, AUDIT_LOG_ROTATE_SECONDS)
+loop_watchdog = LoopWatchdog(
+    threshold=LOOP_LAG_THRESHOLD_MS / 1000,
+    tick_interval=min(0.05, LOOP_LAG_THRESHOLD_MS / 2000),
+    report_interval=LOOP_WATCHDOG_REPORT_SECONDS,
+    wrappers=("tenant_middleware",)
+) if LOOP_WATCHDOG else None
+
+# AUTOINCREMENT не даёт повторно выдать id удалённого товара: id используется в ссылках p<id>
+PRODUCTS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER,
+        name TEXT,
+        channel_message_id INTEGER,
+        ozon_link TEXT DEFAULT "",
+        wb_link TEXT DEFAULT "",
+        ym_link TEXT DEFAULT "",
+        date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        file_id TEXT DEFAULT "",
+        file_type TEXT DEFAULT "",
+        caption TEXT DEFAULT "",
+        photo_id TEXT DEFAULT "",
+        channel_id INTEGER DEFAULT 0,
+        card_text TEXT DEFAULT "",
+        FOREIGN KEY (category_id) REFERENCES categories (id),
+        UNIQUE(category_id, name)
+    )
+    '''
 
-def init_db():
+def init_db(legacy_channel_id=None):
     db_exists = os.path.exists(DB_PATH)
 
     if db_exists:
@@ -71,6 +102,33 @@ def init_db():
         if "photo_id" not in columns:
             logger.info("Добавление колонки photo_id в таблицу products")
             cursor.execute("ALTER TABLE products ADD COLUMN photo_id TEXT DEFAULT ''")
+        if "channel_id" not in columns:
+            logger.info("Добавление колонки channel_id в таблицу products")
+            cursor.execute("ALTER TABLE products ADD COLUMN channel_id INTEGER DEFAULT 0")
+        if "card_text" not in columns:
+            logger.info("Добавление колонки card_text в таблицу products")
+            cursor.execute("ALTER TABLE products ADD COLUMN card_text TEXT DEFAULT ''")
+
+        # Товары, добавленные до появления channel_id, относятся к исходному FILES_CHANNEL_ID
+        cursor.execute("SELECT COUNT(*) FROM products WHERE channel_id IS NULL OR channel_id = 0")
+        legacy_count = cursor.fetchone()[0]
+        if legacy_count and legacy_channel_id:
+            logger.info(f"Заполнение channel_id={legacy_channel_id} для {legacy_count} товаров")
+            cursor.execute("UPDATE products SET channel_id = ? WHERE channel_id IS NULL OR channel_id = 0",
+                          (legacy_channel_id,))
+        elif legacy_count:
+            logger.error(f"У {legacy_count} товаров не указан канал; задайте FILES_CHANNEL_ID "
+                         f"исходного канала файлов, чтобы их карточки отправлялись")
+
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'products'")
+        if "AUTOINCREMENT" not in cursor.fetchone()[0].upper():
+            logger.info("Перестроение таблицы products с AUTOINCREMENT")
+            cursor.execute("PRAGMA table_info(products)")
+            column_list = ", ".join(column[1] for column in cursor.fetchall())
+            cursor.execute(PRODUCTS_TABLE_SQL.format(table="products_new"))
+            cursor.execute(f"INSERT INTO products_new ({column_list}) SELECT {column_list} FROM products")
+            cursor.execute("DROP TABLE products")
+            cursor.execute("ALTER TABLE products_new RENAME TO products")
 
         conn.commit()
         conn.close()
@@ -98,24 +156,7 @@ def init_db():
     )
     ''')
 
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS products (
-        id INTEGER PRIMARY KEY,
-        category_id INTEGER,
-        name TEXT,
-        channel_message_id INTEGER,
-        ozon_link TEXT DEFAULT "",
-        wb_link TEXT DEFAULT "",
-        ym_link TEXT DEFAULT "",
-        date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        file_id TEXT DEFAULT "",
-        file_type TEXT DEFAULT "",
-        caption TEXT DEFAULT "",
-        photo_id TEXT DEFAULT "",
-        FOREIGN KEY (category_id) REFERENCES categories (id),
-        UNIQUE(category_id, name)
-    )
-    ''')
+    cursor.execute(PRODUCTS_TABLE_SQL.format(table="products"))
 
     conn.commit()
     conn.close()
@@ -158,7 +199,7 @@ def get_category_id(brand_id, category_name):
     conn.close()
     return category_id
 
-def add_product(brand_name, category_name, product_name, channel_message_id,
+def add_product(brand_name, category_name, product_name, channel_id, channel_message_id,
                 ozon_link="", wb_link="", ym_link="", photo_id=""):
     try:
         brand_id = get_brand_id(brand_name)
@@ -167,12 +208,23 @@ def add_product(brand_name, category_name, product_name, channel_message_id,
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
 
+        # Обновление существующего товара сохраняет его id, на который ведут ссылки p<id>
         cursor.execute("""
-        INSERT OR REPLACE INTO products
-        (category_id, name, channel_message_id, ozon_link, wb_link, ym_link, date_added, photo_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO products
+        (category_id, name, channel_message_id, ozon_link, wb_link, ym_link, date_added, photo_id,
+         channel_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(category_id, name) DO UPDATE SET
+            channel_message_id = excluded.channel_message_id,
+            ozon_link = excluded.ozon_link,
+            wb_link = excluded.wb_link,
+            ym_link = excluded.ym_link,
+            date_added = excluded.date_added,
+            photo_id = excluded.photo_id,
+            channel_id = excluded.channel_id,
+            card_text = ''
         """, (category_id, product_name, channel_message_id,
-              ozon_link, wb_link, ym_link, datetime.now(), photo_id))
+              ozon_link, wb_link, ym_link, datetime.now(), photo_id, channel_id))
 
         conn.commit()
         conn.close()
@@ -222,30 +274,144 @@ def get_products(brand_name, category_name):
     conn.close()
     return products
 
-def get_product_info(product_name):
+CATALOG = {"brands": {}, "categories": {}, "products": {}}
+
+# Общий запрос и порядок колонок для полной загрузки каталога и обновления одного товара
+CATALOG_PRODUCTS_SQL = """
+SELECT p.id, p.category_id, c.brand_id, b.name, c.name, p.name, p.channel_id, p.channel_message_id,
+       p.ozon_link, p.wb_link, p.ym_link, p.photo_id, p.file_type, p.card_text
+FROM products p
+LEFT JOIN categories c ON p.category_id = c.id
+LEFT JOIN brands b ON c.brand_id = b.id
+"""
+
+def catalog_product_entry(row):
+    return {
+        "id": row[0],
+        "category_id": row[1],
+        "brand": row[3] or "",
+        "category": row[4] or "",
+        "name": row[5],
+        "channel_id": row[6] or 0,
+        "channel_message_id": row[7],
+        "ozon_link": row[8] or "",
+        "wb_link": row[9] or "",
+        "ym_link": row[10] or "",
+        "photo_id": row[11] or "",
+        "file_type": row[12] or "",
+        "card_text": row[13] or ""
+    }
+
+def load_catalog():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    cursor.execute("""
-    SELECT p.channel_message_id, p.ozon_link, p.wb_link, p.ym_link, p.photo_id
-    FROM products p
-    WHERE p.name = ?
-    """, (product_name,))
+    cursor.execute("SELECT id, name FROM brands")
+    brands = {row[0]: row[1] for row in cursor.fetchall()}
 
-    result = cursor.fetchone()
+    cursor.execute("SELECT id, brand_id, name FROM categories")
+    categories = {
+        row[0]: {"brand_id": row[1], "brand": brands.get(row[1], ""), "name": row[2]}
+        for row in cursor.fetchall()
+    }
+
+    cursor.execute(CATALOG_PRODUCTS_SQL)
+    products = {row[0]: catalog_product_entry(row) for row in cursor.fetchall()}
 
     conn.close()
 
-    if result:
-        return {
-            "channel_message_id": result[0],
-            "ozon_link": result[1] or "",
-            "wb_link": result[2] or "",
-            "ym_link": result[3] or "",
-            "photo_id": result[4] or ""
-        }
+    CATALOG["brands"] = brands
+    CATALOG["categories"] = categories
+    CATALOG["products"] = products
+    logger.info(f"Каталог загружен: брендов {len(brands)}, категорий {len(categories)}, товаров {len(products)}")
+
+def find_catalog_product(brand_name, category_name, product_name):
+    for product in CATALOG["products"].values():
+        if (product["name"] == product_name and product["category"] == category_name
+                and product["brand"] == brand_name):
+            return product
     return None
 
+def refresh_catalog_product(product_id):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute(CATALOG_PRODUCTS_SQL + " WHERE p.id = ?", (product_id,))
+    row = cursor.fetchone()
+
+    conn.close()
+
+    if not row or row[2] is None:
+        CATALOG["products"].pop(product_id, None)
+        return
+
+    product = catalog_product_entry(row)
+    CATALOG["brands"][row[2]] = product["brand"]
+    CATALOG["categories"][product["category_id"]] = {
+        "brand_id": row[2], "brand": product["brand"], "name": product["category"]
+    }
+    CATALOG["products"][product["id"]] = product
+
+def upsert_channel_product(brand_name, category_name, product_name, channel_id, channel_message_id,
+                           links, file_id="", file_type="", caption="", card_text=""):
+    try:
+        brand_id = get_brand_id(brand_name)
+        category_id = get_category_id(brand_id, category_name)
+
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id FROM products WHERE channel_id = ? AND channel_message_id = ?",
+                      (channel_id, channel_message_id))
+        result = cursor.fetchone()
+        product_id = result[0] if result else None
+
+        # Товар с таким названием, привязанный к другому посту, не перехватывается
+        cursor.execute("""
+        SELECT id, channel_id, channel_message_id FROM products
+        WHERE category_id = ? AND name = ? AND id IS NOT ?
+        """, (category_id, product_name, product_id))
+        conflict = cursor.fetchone()
+        if conflict:
+            conn.close()
+            return None, (
+                f"Товар '{product_name}' в категории '{category_name}' бренда '{brand_name}' "
+                f"уже привязан к сообщению {conflict[2]} канала {conflict[1]}"
+            )
+
+        # Пустые ссылки из поста не затирают ранее сохранённые
+        if product_id is not None:
+            cursor.execute("""
+            UPDATE products
+            SET category_id = ?, name = ?,
+                ozon_link = CASE WHEN ? != '' THEN ? ELSE ozon_link END,
+                wb_link = CASE WHEN ? != '' THEN ? ELSE wb_link END,
+                ym_link = CASE WHEN ? != '' THEN ? ELSE ym_link END,
+                file_id = ?, file_type = ?, caption = ?, card_text = ?
+            WHERE id = ?
+            """, (category_id, product_name,
+                  links["ozon_link"], links["ozon_link"],
+                  links["wb_link"], links["wb_link"],
+                  links["ym_link"], links["ym_link"],
+                  file_id, file_type, caption, card_text, product_id))
+        else:
+            cursor.execute("""
+            INSERT INTO products
+            (category_id, name, channel_id, channel_message_id, ozon_link, wb_link, ym_link, date_added,
+             file_id, file_type, caption, card_text)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (category_id, product_name, channel_id, channel_message_id,
+                  links["ozon_link"], links["wb_link"], links["ym_link"], datetime.now(),
+                  file_id, file_type, caption, card_text))
+            product_id = cursor.lastrowid
+
+        conn.commit()
+        conn.close()
+        return product_id, None
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении товара из канала: {e}")
+        return None, f"Ошибка при сохранении товара: {e}"
+
 def delete_product(brand_name, category_name, product_name):
     try:
         conn = sqlite3.connect(DB_PATH)
@@ -283,9 +449,17 @@ def delete_product(brand_name, category_name, product_name):
         logger.error(f"Ошибка при удалении товара: {e}")
         return False, f"Ошибка при удалении товара: {str(e)}"
 
+@dp.update.outer_middleware()
+async def tenant_middleware(handler, event, data):
+    data["tenant"] = TENANTS[data["bot"].id]
+    return await handler(event, data)
+
+def get_tenant_brands(tenant):
+    return [brand for brand in get_brands() if tenant.allows_brand(brand)]
+
 @dp.message(Command("delete_product"))
-async def delete_product_command(message: types.Message):
-    if message.from_user.id not in OPERATORS:
+async def delete_product_command(message: types.Message, tenant: Tenant):
+    if message.from_user.id not in tenant.operators:
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
 
@@ -303,9 +477,14 @@ async def delete_product_command(message: types.Message):
         category_name = args[1]
         product_name = args[2]
 
+        if not tenant.allows_brand(brand_name):
+            await message.answer(f"❌ Бренд '{brand_name}' недоступен в этом боте")
+            return
+
         success, message_text = delete_product(brand_name, category_name, product_name)
 
         if success:
+            load_catalog()
             await message.answer(f"✅ {message_text}")
         else:
             await message.answer(f"❌ {message_text}")
@@ -348,50 +527,147 @@ kb_exit_chat = ReplyKeyboardMarkup(
     resize_keyboard=True
 )
 
+async def send_product_card(tenant, chat_id, product_info):
+    buy_buttons = []
+
+    if product_info["ozon_link"]:
+        buy_buttons.append([InlineKeyboardButton(text="🛒 Купить на Ozon",
+                                                url=product_info["ozon_link"])])
+
+    if product_info["wb_link"]:
+        buy_buttons.append([InlineKeyboardButton(text="🛒 Купить на Wildberries",
+                                               url=product_info["wb_link"])])
+
+    if product_info["ym_link"]:
+        buy_buttons.append([InlineKeyboardButton(text="🛒 Купить на Яндекс.Маркет",
+                                               url=product_info["ym_link"])])
+
+    buy_markup = InlineKeyboardMarkup(inline_keyboard=buy_buttons) if buy_buttons else None
+    from_chat_id = product_info["channel_id"]
+
+    if product_info["photo_id"] and int(product_info["photo_id"]) > 0:
+        try:
+            await tenant.bot.copy_message(
+                chat_id=chat_id,
+                from_chat_id=from_chat_id,
+                message_id=int(product_info["photo_id"])
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при отправке фото товара: {e}")
+
+    # У товаров из канала служебные строки поста (заголовок, хэштеги, ozon:/wb:/ym:) вырезаны
+    if product_info["card_text"]:
+        try:
+            if product_info["file_type"] == "text":
+                await tenant.bot.send_message(
+                    chat_id=chat_id,
+                    text=product_info["card_text"],
+                    parse_mode="HTML",
+                    reply_markup=buy_markup
+                )
+            else:
+                await tenant.bot.copy_message(
+                    chat_id=chat_id,
+                    from_chat_id=from_chat_id,
+                    message_id=product_info["channel_message_id"],
+                    caption=product_info["card_text"],
+                    parse_mode="HTML",
+                    reply_markup=buy_markup
+                )
+            return
+        except Exception as e:
+            logger.error(f"Ошибка при отправке очищенной карточки товара {product_info['id']}: {e}")
+
+    await tenant.bot.copy_message(
+        chat_id=chat_id,
+        from_chat_id=from_chat_id,
+        message_id=product_info["channel_message_id"],
+        reply_markup=buy_markup
+    )
+
+DEEP_LINK_RE = re.compile(r"^([pbc])(\d+)$")
+
+async def open_deep_link(tenant, message, state, payload):
+    match = DEEP_LINK_RE.match(payload)
+    if not match:
+        return False
+
+    kind, item_id = match.group(1), int(match.group(2))
+
+    if kind == "p":
+        product_info = CATALOG["products"].get(item_id)
+        if not product_info or not tenant.allows_brand(product_info["brand"]):
+            return False
+        try:
+            await send_product_card(tenant, message.chat.id, product_info)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке товара по ссылке {payload}: {e}")
+            return False
+        await state.clear()
+        await message.answer("Выберите дальнейшее действие:", reply_markup=kb_main)
+        return True
+
+    if kind == "b":
+        brand_name = CATALOG["brands"].get(item_id)
+        categories = []
+        if brand_name and tenant.allows_brand(brand_name):
+            categories = [
+                category["name"] for category in CATALOG["categories"].values()
+                if category["brand_id"] == item_id
+            ]
+        if not categories:
+            return False
+        await state.set_data({"selected_brand": brand_name})
+        await state.set_state(BotState.waiting_for_category)
+        await message.answer(f"Выберите категорию товаров {brand_name}:",
+                             reply_markup=create_dynamic_keyboard(categories))
+        return True
+
+    category = CATALOG["categories"].get(item_id)
+    products = []
+    if category and tenant.allows_brand(category["brand"]):
+        products = [
+            product["name"] for product in CATALOG["products"].values()
+            if product["category_id"] == item_id
+        ]
+    if not products:
+        return False
+    await state.set_data({"selected_brand": category["brand"], "selected_category": category["name"]})
+    await state.set_state(BotState.waiting_for_product)
+    await message.answer(f"Выберите товар из категории {category['name']}:",
+                         reply_markup=create_dynamic_keyboard(products))
+    return True
+
 @dp.message(Command("start"))
-async def cmd_start(message: types.Message):
+async def cmd_start(message: types.Message, state: FSMContext, command: CommandObject, tenant: Tenant):
     user_id = message.from_user.id
     username = message.from_user.username or "Без имени"
+    payload = command.args or ""
     log_message = (
         f"🚀 <b>Бот запущен пользователем</b>\n"
         f"👤 Пользователь: <b>{username}</b>\n"
         f"🆔 ID: <code>{user_id}</code>"
     )
-    await send_log(log_message, "USER_ACTION")
+    if payload:
+        log_message += f"\n🔗 Ссылка: <code>{payload}</code>"
+    await send_log(tenant, log_message, "USER_ACTION", event="start", user_id=user_id,
+                   username=username, payload=payload)
+
+    if payload and await open_deep_link(tenant, message, state, payload):
+        return
 
     kb_shops = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text="Wildberries",
-                url="https://www.wildberries.ru/seller/159267"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text="Ozon",
-                url="https://www.ozon.ru/seller/oneenergy-69819/products/?miniapp=seller_69819"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text="Яндекс.Маркет",
-                url="https://market.yandex.ru/business--oneenergy-llc/1044944?generalContext=t%3DshopInShop%3Bi%3D1%3Bbi%3D1044944%3B&rs=eJwzUv_EqMLBKLDwEKsEg8azbh6NnqOsGhuBuPE4q8aPU6waZ0-zajzv5gEAEloOnw%2C%2C&searchContext=sins_ctx"
-            )
-        ]
+        [InlineKeyboardButton(text=shop["text"], url=shop["url"])]
+        for shop in tenant.shops
     ])
 
-    await message.answer(
-        "👋 Добро пожаловать в бот поддержки ONEENERGY!\n\n"
-        "Здесь вы можете получить информацию о наших продуктах, гарантии и возврате.\n\n"
-        "Ознакомиться с нашим ассортиментом можно в магазинах:",
-        reply_markup=kb_shops
-    )
+    await message.answer(tenant.texts["welcome"], reply_markup=kb_shops)
 
     await message.answer("Выберите действие:", reply_markup=kb_main)
 
 @dp.message(F.text == "Наш ассортимент")
-async def show_assortment(message: types.Message, state: FSMContext):
-    brands = get_brands()
+async def show_assortment(message: types.Message, state: FSMContext, tenant: Tenant):
+    brands = get_tenant_brands(tenant)
 
     if not brands:
         await message.answer("В данный момент нет доступных товаров.", reply_markup=kb_main)
@@ -403,14 +679,14 @@ async def show_assortment(message: types.Message, state: FSMContext):
     await message.answer("Выберите бренд:", reply_markup=kb_brands)
 
 @dp.message(StateFilter(BotState.waiting_for_brand))
-async def brand_selected(message: types.Message, state: FSMContext):
+async def brand_selected(message: types.Message, state: FSMContext, tenant: Tenant):
     if message.text == "⬅️ Назад":
         await state.clear()
         await message.answer(".", reply_markup=kb_main)
         return
 
     brand_name = message.text
-    categories = get_categories(brand_name)
+    categories = get_categories(brand_name) if tenant.allows_brand(brand_name) else []
 
     if not categories:
         await message.answer(f"Для бренда {brand_name} нет доступных категорий.", reply_markup=kb_main)
@@ -424,9 +700,9 @@ async def brand_selected(message: types.Message, state: FSMContext):
     await message.answer(f"Выберите категорию товаров {brand_name}:", reply_markup=kb_categories)
 
 @dp.message(StateFilter(BotState.waiting_for_category))
-async def category_selected(message: types.Message, state: FSMContext):
+async def category_selected(message: types.Message, state: FSMContext, tenant: Tenant):
     if message.text == "⬅️ Назад":
-        brands = get_brands()
+        brands = get_tenant_brands(tenant)
         kb_brands = create_dynamic_keyboard(brands)
 
         await state.set_state(BotState.waiting_for_brand)
@@ -453,7 +729,7 @@ async def category_selected(message: types.Message, state: FSMContext):
                          reply_markup=kb_products)
 
 @dp.message(StateFilter(BotState.waiting_for_product))
-async def product_selected(message: types.Message, state: FSMContext):
+async def product_selected(message: types.Message, state: FSMContext, tenant: Tenant):
     if message.text == "⬅️ Назад":
         user_data = await state.get_data()
         brand_name = user_data.get("selected_brand")
@@ -466,7 +742,10 @@ async def product_selected(message: types.Message, state: FSMContext):
         return
 
     product_name = message.text
-    product_info = get_product_info(product_name)
+    user_data = await state.get_data()
+    product_info = find_catalog_product(
+        user_data.get("selected_brand"), user_data.get("selected_category"), product_name
+    )
 
     if not product_info:
         await message.answer(f"Информация о товаре {product_name} не найдена.",
@@ -475,38 +754,7 @@ async def product_selected(message: types.Message, state: FSMContext):
         return
 
     try:
-        buy_buttons = []
-
-        if product_info["ozon_link"]:
-            buy_buttons.append([InlineKeyboardButton(text="🛒 Купить на Ozon",
-                                                    url=product_info["ozon_link"])])
-
-        if product_info["wb_link"]:
-            buy_buttons.append([InlineKeyboardButton(text="🛒 Купить на Wildberries",
-                                                   url=product_info["wb_link"])])
-
-        if product_info["ym_link"]:
-            buy_buttons.append([InlineKeyboardButton(text="🛒 Купить на Яндекс.Маркет",
-                                                   url=product_info["ym_link"])])
-
-        buy_markup = InlineKeyboardMarkup(inline_keyboard=buy_buttons) if buy_buttons else None
-
-        if product_info["photo_id"] and int(product_info["photo_id"]) > 0:
-            try:
-                await bot.copy_message(
-                    chat_id=message.chat.id,
-                    from_chat_id=FILES_CHANNEL_ID,
-                    message_id=int(product_info["photo_id"])
-                )
-            except Exception as e:
-                logger.error(f"Ошибка при отправке фото товара: {e}")
-
-        await bot.copy_message(
-            chat_id=message.chat.id,
-            from_chat_id=FILES_CHANNEL_ID,
-            message_id=product_info["channel_message_id"],
-            reply_markup=buy_markup
-        )
+        await send_product_card(tenant, message.chat.id, product_info)
 
         await state.clear()
         await message.answer("Выберите дальнейшее действие:", reply_markup=kb_main)
@@ -520,8 +768,8 @@ async def product_selected(message: types.Message, state: FSMContext):
         await state.clear()
 
 @dp.message(Command("add_product"))
-async def add_product_command(message: types.Message):
-    if message.from_user.id not in OPERATORS:
+async def add_product_command(message: types.Message, tenant: Tenant):
+    if message.from_user.id not in tenant.operators:
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
 
@@ -539,6 +787,10 @@ async def add_product_command(message: types.Message):
         category_name = args[1]
         product_name = args[2]
 
+        if not tenant.allows_brand(brand_name):
+            await message.answer(f"❌ Бренд '{brand_name}' недоступен в этом боте")
+            return
+
         try:
             message_id = int(args[3])
         except ValueError:
@@ -569,6 +821,7 @@ async def add_product_command(message: types.Message):
             brand_name,
             category_name,
             product_name,
+            tenant.files_channel_id,
             message_id,
             links["ozon_link"],
             links["wb_link"],
@@ -586,9 +839,9 @@ async def add_product_command(message: types.Message):
             )
 
             try:
-                forwarded = await bot.forward_message(
+                forwarded = await tenant.bot.forward_message(
                     chat_id=message.chat.id,
-                    from_chat_id=FILES_CHANNEL_ID,
+                    from_chat_id=tenant.files_channel_id,
                     message_id=message_id
                 )
 
@@ -605,7 +858,7 @@ async def add_product_command(message: types.Message):
                     file_type = "photo"
                     caption = forwarded.caption or ""
 
-                await bot.delete_message(
+                await tenant.bot.delete_message(
                     chat_id=message.chat.id,
                     message_id=forwarded.message_id
                 )
@@ -615,13 +868,15 @@ async def add_product_command(message: types.Message):
                 cursor.execute("""
                 UPDATE products
                 SET file_id = ?, file_type = ?, caption = ?
-                WHERE channel_message_id = ?
-                """, (file_id, file_type, caption, message_id))
+                WHERE channel_id = ? AND channel_message_id = ?
+                """, (file_id, file_type, caption, tenant.files_channel_id, message_id))
                 conn.commit()
                 conn.close()
 
             except Exception as e:
                 logger.error(f"Ошибка при получении file_id: {e}")
+
+            load_catalog()
         else:
             await message.answer("❌ Ошибка при добавлении товара.")
 
@@ -629,13 +884,220 @@ async def add_product_command(message: types.Message):
         logger.error(f"Ошибка в команде add_product: {e}")
         await message.answer(f"❌ Произошла ошибка: {str(e)}")
 
+POST_HEADER_RE = re.compile(r"^\s*\[(.+?)\]\s*\[(.+?)\]\s*\[(.+?)\]")
+POST_HASHTAG_RE = re.compile(r"#(brand|бренд|category|категория|name|название|товар)_([^\s#]+)", re.IGNORECASE)
+POST_LINK_PREFIX_RE = re.compile(r"\b(ozon|wb|ym):(https?://\S+)")
+POST_URL_RE = re.compile(r"https?://\S+")
+URL_TRAILING_PUNCTUATION = ".,;:!?)"
+MARKETPLACE_DOMAINS = {
+    "ozon_link": ("ozon.ru",),
+    "wb_link": ("wildberries.ru", "wb.ru"),
+    "ym_link": ("market.yandex.ru",)
+}
+HASHTAG_FIELDS = {
+    "brand": "brand", "бренд": "brand",
+    "category": "category", "категория": "category",
+    "name": "name", "название": "name", "товар": "name"
+}
+
+def parse_product_post(text, urls=()):
+    fields = {}
+
+    header = POST_HEADER_RE.match(text)
+    if header:
+        fields = {"brand": header.group(1), "category": header.group(2), "name": header.group(3)}
+    else:
+        for key, value in POST_HASHTAG_RE.findall(text):
+            fields.setdefault(HASHTAG_FIELDS[key.lower()], value.rstrip(URL_TRAILING_PUNCTUATION).replace("_", " "))
+
+    if not all(fields.get(key, "").strip() for key in ("brand", "category", "name")):
+        return None
+
+    links = {"ozon_link": "", "wb_link": "", "ym_link": ""}
+    text_urls = [url.rstrip(URL_TRAILING_PUNCTUATION) for url in POST_URL_RE.findall(text)]
+    for url in list(urls) + text_urls:
+        host = url.split("/")[2].lower() if url.count("/") >= 2 else ""
+        for field, domains in MARKETPLACE_DOMAINS.items():
+            if not links[field] and any(host == d or host.endswith("." + d) for d in domains):
+                links[field] = url
+    for prefix, url in POST_LINK_PREFIX_RE.findall(text):
+        links[f"{prefix}_link"] = url.rstrip(URL_TRAILING_PUNCTUATION)
+
+    return {
+        "brand": fields["brand"].strip(),
+        "category": fields["category"].strip(),
+        "name": fields["name"].strip(),
+        "links": links
+    }
+
+def clean_post_text(text_html, has_header):
+    lines = text_html.split("\n")
+    if has_header:
+        lines = lines[1:]
+    text = "\n".join(lines)
+    text = POST_HASHTAG_RE.sub("", text)
+    text = POST_LINK_PREFIX_RE.sub("", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = re.sub(r"[ \t]+\n|\n[ \t]+", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+async def ingest_channel_post(tenant, message, edited=False):
+    text = message.caption or message.text or ""
+    entities = message.caption_entities or message.entities or []
+    urls = [entity.url for entity in entities if entity.type == "text_link" and entity.url]
+
+    parsed = parse_product_post(text, urls)
+    if not parsed:
+        return
+    if not tenant.allows_brand(parsed["brand"]):
+        logger.info(f"Пост {message.message_id} пропущен: бренд {parsed['brand']} недоступен боту {tenant.name}")
+        return
+
+    file_id = ""
+    file_type = ""
+    if message.document:
+        file_id = message.document.file_id
+        file_type = "document"
+    elif message.photo:
+        file_id = message.photo[-1].file_id
+        file_type = "photo"
+    elif message.text is not None:
+        file_type = "text"
+
+    # Покупателю показывается пост без служебных строк, по которым он разобран
+    card_text = clean_post_text(message.html_text, bool(POST_HEADER_RE.match(text)))
+    if not card_text:
+        card_text = f"<b>{html.escape(parsed['name'])}</b>"
+
+    product_id, error = upsert_channel_product(
+        parsed["brand"],
+        parsed["category"],
+        parsed["name"],
+        message.chat.id,
+        message.message_id,
+        parsed["links"],
+        file_id,
+        file_type,
+        message.caption or "",
+        card_text
+    )
+    if product_id is None:
+        log_message = (
+            f"⚠️ <b>Товар из канала не сохранён</b>\n"
+            f"📦 Название: <b>{parsed['name']}</b>\n"
+            f"🆔 ID сообщения: <code>{message.message_id}</code>\n"
+            f"❌ Причина: {error}"
+        )
+        await send_log(tenant, log_message, "CATALOG", event="product_rejected",
+                       channel_message_id=message.message_id, edited=edited, reason=error)
+        return
+
+    refresh_catalog_product(product_id)
+
+    log_message = (
+        f"📥 <b>Товар {'обновлён' if edited else 'добавлен'} из канала</b>\n"
+        f"🏷 Бренд: <b>{parsed['brand']}</b>\n"
+        f"📂 Категория: <b>{parsed['category']}</b>\n"
+        f"📦 Название: <b>{parsed['name']}</b>\n"
+        f"🆔 ID сообщения: <code>{message.message_id}</code>"
+    )
+    await send_log(tenant, log_message, "CATALOG", event="product_ingested", product_id=product_id,
+                   channel_message_id=message.message_id, edited=edited)
+
+pending_post_edits = {}
+
+async def ingest_edited_post_later(tenant, message):
+    try:
+        await asyncio.sleep(INGEST_DEBOUNCE_SECONDS)
+    except asyncio.CancelledError:
+        return
+    # Запись удаляется до обработки, чтобы новая правка не отменила уже начатое сохранение
+    pending_post_edits.pop((message.chat.id, message.message_id), None)
+    try:
+        await ingest_channel_post(tenant, message, edited=True)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке изменённого поста {message.message_id}: {e}")
+
+def from_files_channel(message: types.Message, tenant: Tenant):
+    return message.chat.id == tenant.files_channel_id
+
+@dp.channel_post(from_files_channel)
+async def files_channel_post(message: types.Message, tenant: Tenant):
+    try:
+        await ingest_channel_post(tenant, message)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке поста {message.message_id}: {e}")
+
+@dp.edited_channel_post(from_files_channel)
+async def files_channel_post_edited(message: types.Message, tenant: Tenant):
+    key = (message.chat.id, message.message_id)
+    previous = pending_post_edits.pop(key, None)
+    if previous:
+        previous.cancel()
+    pending_post_edits[key] = asyncio.create_task(ingest_edited_post_later(tenant, message))
+
+@dp.message(Command("links"))
+async def links_command(message: types.Message, tenant: Tenant):
+    if message.from_user.id not in tenant.operators:
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    brands = sorted(
+        (item for item in CATALOG["brands"].items() if tenant.allows_brand(item[1])),
+        key=lambda item: item[1]
+    )
+    if not brands:
+        await message.answer("В каталоге нет товаров.")
+        return
+
+    me = await tenant.bot.me()
+    base_url = f"https://t.me/{me.username}?start="
+
+    lines = []
+    for brand_id, brand_name in brands:
+        lines.append(f"🏷 {brand_name}: {base_url}b{brand_id}")
+        categories = sorted(
+            (item for item in CATALOG["categories"].items() if item[1]["brand_id"] == brand_id),
+            key=lambda item: item[1]["name"]
+        )
+        for category_id, category in categories:
+            lines.append(f"  📂 {category['name']}: {base_url}c{category_id}")
+            products = sorted(
+                (p for p in CATALOG["products"].values() if p["category_id"] == category_id),
+                key=lambda p: p["name"]
+            )
+            for product in products:
+                lines.append(f"    • {product['name']}: {base_url}p{product['id']}")
+
+    chunk = ""
+    for line in lines:
+        if len(chunk) + len(line) + 1 > 4000:
+            await message.answer(chunk, disable_web_page_preview=True)
+            chunk = ""
+        chunk += line + "\n"
+    if chunk:
+        await message.answer(chunk, disable_web_page_preview=True)
+
+@dp.message(Command("loop_stats"))
+async def loop_stats_command(message: types.Message, tenant: Tenant):
+    if message.from_user.id not in tenant.operators:
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        return
+
+    if loop_watchdog is None:
+        await message.answer("Watchdog цикла событий выключен (LOOP_WATCHDOG=1 для включения).")
+        return
+
+    await message.answer(loop_watchdog.format_report())
+
 @dp.message(F.text == "👨‍💼 Связаться с оператором")
 async def contact_operator_start(message: types.Message, state: FSMContext):
     await message.answer("Вы подключены к оператору. Напишите ваш вопрос:", reply_markup=kb_exit_chat)
     await state.set_state(BotState.chatting_with_operator)
 
 @dp.message(StateFilter(BotState.chatting_with_operator))
-async def forward_to_operator(message: types.Message, state: FSMContext):
+async def forward_to_operator(message: types.Message, state: FSMContext, tenant: Tenant):
     user_id = message.from_user.id
     username = message.from_user.username or "Без имени"
     user_text = message.text
@@ -646,7 +1108,8 @@ async def forward_to_operator(message: types.Message, state: FSMContext):
         f"🆔 ID: <code>{user_id}</code>\n"
         f"📝 Текст: <i>{user_text}</i>"
     )
-    await send_log(log_message, "USER_ACTION")
+    await send_log(tenant, log_message, "USER_ACTION", event="operator_message",
+                   user_id=user_id, username=username, text=user_text)
 
     if message.text == "⬅️ Назад":
         await state.clear()
@@ -663,9 +1126,9 @@ async def forward_to_operator(message: types.Message, state: FSMContext):
     )
 
     sent_to_someone = False
-    for operator in OPERATORS:
+    for operator in tenant.operators:
         try:
-            await bot.send_message(chat_id=operator, text=text, parse_mode="HTML")
+            await tenant.bot.send_message(chat_id=operator, text=text, parse_mode="HTML")
             sent_to_someone = True
         except Exception as e:
             logger.error(f"Не удалось отправить сообщение оператору {operator}: {e}")
@@ -678,8 +1141,8 @@ async def forward_to_operator(message: types.Message, state: FSMContext):
         await state.clear()
 
 @dp.message(Command("reply"))
-async def operator_reply(message: types.Message):
-    if message.from_user.id not in OPERATORS:
+async def operator_reply(message: types.Message, tenant: Tenant):
+    if message.from_user.id not in tenant.operators:
         return
 
     args = message.text.split(maxsplit=2)
@@ -698,39 +1161,41 @@ async def operator_reply(message: types.Message):
         f"👤 Пользователю: <code>{user_id}</code>\n"
         f"📝 Текст: <i>{reply_text}</i>"
     )
-    await send_log(log_message, "OPERATOR_ACTION")
+    # В аудит-логе user_id всегда число, как в остальных событиях
+    try:
+        user_fields = {"user_id": int(user_id)}
+    except ValueError:
+        user_fields = {"user_id_raw": user_id}
+    await send_log(tenant, log_message, "OPERATOR_ACTION", event="operator_reply",
+                   operator_id=operator_id, operator_username=operator_username,
+                   text=reply_text, **user_fields)
 
     try:
-        await bot.send_message(chat_id=int(user_id), text=f"📩 Ответ от оператора:\n\n{reply_text}")
+        await tenant.bot.send_message(chat_id=int(user_id), text=f"📩 Ответ от оператора:\n\n{reply_text}")
         await message.answer(f"✅ Ответ отправлен пользователю {user_id}.")
     except Exception as e:
         await message.answer(f"❌ Ошибка при отправке сообщения: {e}")
 
 @dp.message(F.text == "Гарантия")
-async def show_warranty(message: types.Message):
-    warranty_text = (
-        "📝 *Информация о гарантии*\n\n"
-        "Гарантия на товар 2 года. Возврат товара возможен только при наличии брака или надлежащего качества с сохранением его товарного вида (не нарушением упаковки).\n\n"
-        "*В соответствии с Постановлением Правительства РФ от 31.12.2020 N 2463 (ред. от 17.05.2024) \"Об утверждении Правил продажи товаров по договору розничной купли-продажи, перечня товаров длительного пользования, на которые не распространяется требование потребителя о безвозмездном предоставлении ему товара, обладающего этими же основными потребительскими свойствами, на период ремонта или замены такого товара, и перечня непродовольственных товаров надлежащего качества, не подлежащих обмену, а также о внесении изменений в некоторые акты Правительства Российской Федерации\" с пунктом 11 перечня непродовольственных товаров надлежащего качества, не подлежащих обмену наш товар относится к технически сложному товару, на который установлен срок годности не менее 1 года.*\n\n"
-        "*В соответствии со статьей 25 закона о защите прав потребителя данный товар подлежит возврату, если указанный товар не был в употреблении, сохранены его товарный вид, потребительские свойства, пломбы, фабричные ярлыки. В иных случаях возврат возможен только при наличии технического брака, подтвержденного СЦ.*"
-    )
-    await message.answer(warranty_text, parse_mode="Markdown", reply_markup=kb_main)
+async def show_warranty(message: types.Message, tenant: Tenant):
+    await message.answer(tenant.texts["warranty"], parse_mode="Markdown", reply_markup=kb_main)
 
 @dp.message(F.text == "Возврат")
-async def show_return_policy(message: types.Message):
-    return_text = (
-        "📦 *Политика возврата*\n\n"
-        "Возврат осуществляется через оформление заявки на возврат по браку в личном кабинете маркетпейса, в котором был приобретен товар."
-    )
-    await message.answer(return_text, parse_mode="Markdown", reply_markup=kb_main)
+async def show_return_policy(message: types.Message, tenant: Tenant):
+    await message.answer(tenant.texts["return"], parse_mode="Markdown", reply_markup=kb_main)
+
+async def send_log(tenant, message, log_type="INFO", **fields):
+    now = datetime.now()
+    audit_log.write({
+        "ts": now.isoformat(timespec="seconds"), "tenant": tenant.name, "type": log_type, **fields
+    })
 
-async def send_log(message, log_type="INFO"):
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
         header = f"📋 #{log_type} | {timestamp}\n\n"
 
-        await bot.send_message(
-            chat_id=LOG_CHANNEL_ID,
+        await tenant.bot.send_message(
+            chat_id=tenant.log_channel_id,
             text=header + message,
             parse_mode="HTML",
             disable_web_page_preview=True
@@ -739,26 +1204,54 @@ async def send_log(message, log_type="INFO"):
         logger.error(f"Не удалось отправить лог в канал: {e}")
 
 async def main():
-    init_db()
+    tenants = load_tenants(TENANTS_FILE)
+    legacy_channel_id = os.getenv("FILES_CHANNEL_ID")
+    if legacy_channel_id is None and len(tenants) == 1:
+        legacy_channel_id = tenants[0].files_channel_id
+
+    init_db(int(legacy_channel_id) if legacy_channel_id else None)
+    load_catalog()
+    audit_log.start()
+    if loop_watchdog is not None:
+        loop_watchdog.start()
+
+    # Общая HTTP-сессия: все боты используют один пул соединений к Bot API
+    session = AiohttpSession()
+    for tenant in tenants:
+        tenant.bot = Bot(token=tenant.token, session=session)
+        TENANTS[tenant.bot.id] = tenant
+        logger.info(f"Бот {tenant.name}: токен {tenant.token[:5]}...{tenant.token[-5:]}, "
+                    f"операторы {tenant.operators}, канал файлов {tenant.files_channel_id}, "
+                    f"канал логов {tenant.log_channel_id}, бренды {tenant.brands or 'все'}")
+
+    bots = [tenant.bot for tenant in TENANTS.values()]
+
+    for tenant in TENANTS.values():
+        try:
+            startup_message = (
+                f"🤖 <b>Бот запущен</b>\n"
+                f"⏱ Время: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"📢 Канал файлов: <code>{tenant.files_channel_id}</code>\n"
+                f"👨‍💼 Операторы: <code>{tenant.operators}</code>"
+            )
+            await tenant.bot.send_message(
+                chat_id=tenant.log_channel_id,
+                text=startup_message,
+                parse_mode="HTML"
+            )
+            logger.info(f"Лог запуска бота {tenant.name} отправлен в канал")
+        except Exception as e:
+            logger.error(f"Не удалось отправить стартовый лог бота {tenant.name}: {e}")
 
-    try:
-        startup_message = (
-            f"🤖 <b>Бот запущен</b>\n"
-            f"⏱ Время: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            f"📢 Канал файлов: <code>{FILES_CHANNEL_ID}</code>\n"
-            f"👨‍💼 Операторы: <code>{OPERATORS}</code>"
-        )
-        await bot.send_message(
-            chat_id=LOG_CHANNEL_ID,
-            text=startup_message,
-            parse_mode="HTML"
-        )
-        logger.info("Лог запуска отправлен в канал")
-    except Exception as e:
-        logger.error(f"Не удалось отправить стартовый лог: {e}")
+        await tenant.bot.delete_webhook(drop_pending_updates=True)
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(*bots)
+    finally:
+        if loop_watchdog is not None:
+            await loop_watchdog.stop()
+        await audit_log.close()
+        await session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 5000)
+ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+class LoopWatchdog:
+    def __init__(self, threshold=0.1, tick_interval=0.05, report_interval=600, project_dir=None,
+                 wrappers=()):
+        self.threshold = threshold
+        self.tick_interval = tick_interval
+        self.report_interval = report_interval
+        self.project_dir = project_dir or os.path.dirname(os.path.abspath(__file__))
+        # Функции-обёртки (middleware), которые не считаются обработчиками
+        self.wrappers = set(wrappers)
+        self.lag_histogram = Counter()
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.blocked_by_site = Counter()
+        self.blocked_by_handler = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._thread = None
+        self._tasks = []
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._tasks = [asyncio.create_task(self._tick()), asyncio.create_task(self._report())]
+        self._thread = threading.Thread(target=self._sample, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Watchdog цикла событий запущен, порог {self.threshold * 1000:.0f} мс")
+
+    async def stop(self):
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        logger.info(self.format_report())
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.tick_interval
+            await asyncio.sleep(self.tick_interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(now - expected, 0.0)
+            with self._lock:
+                self.lag_histogram[_bucket(lag)] += 1
+                self.max_lag = max(self.max_lag, lag)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logger.info(self.format_report())
+
+    def _sample(self):
+        # Поток только читает стек цикла, пока тот не обновляет heartbeat
+        stalled_since = None
+        last_sample = None
+        interval = self.threshold / 2
+
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            behind = now - self._heartbeat - self.tick_interval
+            if behind < self.threshold:
+                stalled_since = None
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            handler, site = self._classify(stack)
+
+            heartbeat = self._heartbeat
+            if stalled_since != heartbeat:
+                # Новая задержка: учитываем всё время с момента последнего heartbeat
+                blocked = behind
+                stalled_since = heartbeat
+                with self._lock:
+                    self.stalls += 1
+                logger.warning(
+                    f"Цикл событий заблокирован более {behind * 1000:.0f} мс "
+                    f"в {handler} ({site}):\n{''.join(traceback.format_list(stack[-8:]))}"
+                )
+            else:
+                blocked = now - last_sample
+            last_sample = now
+
+            with self._lock:
+                self.blocked_by_site[site] += blocked
+                self.blocked_by_handler[handler] += blocked
+
+    def _classify(self, stack):
+        # Кадры до запуска колбэка циклом (asyncio.run и т.п.) к обработчику не относятся
+        start = 0
+        for index, entry in enumerate(stack):
+            if entry.filename.startswith(ASYNCIO_DIR):
+                start = index + 1
+        own = [
+            entry for entry in stack[start:]
+            if entry.filename.startswith(self.project_dir) and entry.filename != __file__
+        ]
+        if own:
+            handlers = [entry for entry in own if entry.name not in self.wrappers] or own
+            handler = handlers[0].name
+            site_frame = own[-1]
+        else:
+            handler = "<вне обработчиков>"
+            site_frame = stack[-1]
+        site = f"{os.path.basename(site_frame.filename)}:{site_frame.lineno} {site_frame.name}"
+        return handler, site
+
+    def format_report(self, top=5):
+        with self._lock:
+            histogram = dict(self.lag_histogram)
+            max_lag = self.max_lag
+            stalls = self.stalls
+            sites = self.blocked_by_site.most_common(top)
+            handlers = self.blocked_by_handler.most_common(top)
+
+        lines = [f"Задержка цикла событий: максимум {max_lag * 1000:.0f} мс, блокировок {stalls}"]
+        lines.append("Гистограмма задержек:")
+        for bucket in _bucket_labels():
+            lines.append(f"  {bucket}: {histogram.get(bucket, 0)}")
+        if sites:
+            lines.append("Места блокировок:")
+            lines.extend(f"  {site}: {blocked * 1000:.0f} мс" for site, blocked in sites)
+        if handlers:
+            lines.append("Блокировки по обработчикам:")
+            lines.extend(f"  {handler}: {blocked * 1000:.0f} мс" for handler, blocked in handlers)
+        return "\n".join(lines)
+
+
+def _bucket(lag):
+    lag_ms = lag * 1000
+    for limit in LAG_BUCKETS_MS:
+        if lag_ms < limit:
+            return f"<{limit} мс"
+    return f">={LAG_BUCKETS_MS[-1]} мс"
+
+
+def _bucket_labels():
+    return [f"<{limit} мс" for limit in LAG_BUCKETS_MS] + [f">={LAG_BUCKETS_MS[-1]} мс"]
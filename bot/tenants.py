@@ -0,0 +1,67 @@
+import json
+import os
+
+DEFAULT_BOT_TOKEN = "DEFAULT_BOT_TOKEN"
+DEFAULT_OPERATORS = "DEFAULT_OPERATORS"
+DEFAULT_FILES_CHANNEL_ID = "DEFAULT_FILES_CHANNEL_ID"
+DEFAULT_LOG_CHANNEL_ID = "DEFAULT_LOG_CHANNEL_ID"
+
+DEFAULT_TEXTS = {
+    "welcome": (
+        "👋 Добро пожаловать в бот поддержки ONEENERGY!\n\n"
+        "Здесь вы можете получить информацию о наших продуктах, гарантии и возврате.\n\n"
+        "Ознакомиться с нашим ассортиментом можно в магазинах:"
+    ),
+    "warranty": (
+        "📝 *Информация о гарантии*\n\n"
+        "Гарантия на товар 2 года. Возврат товара возможен только при наличии брака или надлежащего качества с сохранением его товарного вида (не нарушением упаковки).\n\n"
+        "*В соответствии с Постановлением Правительства РФ от 31.12.2020 N 2463 (ред. от 17.05.2024) \"Об утверждении Правил продажи товаров по договору розничной купли-продажи, перечня товаров длительного пользования, на которые не распространяется требование потребителя о безвозмездном предоставлении ему товара, обладающего этими же основными потребительскими свойствами, на период ремонта или замены такого товара, и перечня непродовольственных товаров надлежащего качества, не подлежащих обмену, а также о внесении изменений в некоторые акты Правительства Российской Федерации\" с пунктом 11 перечня непродовольственных товаров надлежащего качества, не подлежащих обмену наш товар относится к технически сложному товару, на который установлен срок годности не менее 1 года.*\n\n"
+        "*В соответствии со статьей 25 закона о защите прав потребителя данный товар подлежит возврату, если указанный товар не был в употреблении, сохранены его товарный вид, потребительские свойства, пломбы, фабричные ярлыки. В иных случаях возврат возможен только при наличии технического брака, подтвержденного СЦ.*"
+    ),
+    "return": (
+        "📦 *Политика возврата*\n\n"
+        "Возврат осуществляется через оформление заявки на возврат по браку в личном кабинете маркетпейса, в котором был приобретен товар."
+    )
+}
+
+DEFAULT_SHOPS = [
+    {"text": "Wildberries", "url": "https://www.wildberries.ru/seller/159267"},
+    {"text": "Ozon", "url": "https://www.ozon.ru/seller/oneenergy-69819/products/?miniapp=seller_69819"},
+    {
+        "text": "Яндекс.Маркет",
+        "url": "https://market.yandex.ru/business--oneenergy-llc/1044944?generalContext=t%3DshopInShop%3Bi%3D1%3Bbi%3D1044944%3B&rs=eJwzUv_EqMLBKLDwEKsEg8azbh6NnqOsGhuBuPE4q8aPU6waZ0-zajzv5gEAEloOnw%2C%2C&searchContext=sins_ctx"
+    }
+]
+
+
+class Tenant:
+    def __init__(self, name, token, operators, files_channel_id, log_channel_id,
+                 brands=None, texts=None, shops=None):
+        self.name = name
+        self.token = token
+        self.operators = [int(op) for op in operators]
+        self.files_channel_id = int(files_channel_id)
+        self.log_channel_id = int(log_channel_id)
+        self.brands = list(brands or [])
+        self.texts = {**DEFAULT_TEXTS, **(texts or {})}
+        self.shops = shops if shops is not None else DEFAULT_SHOPS
+        self.bot = None
+
+    def allows_brand(self, brand_name):
+        # Пустой список брендов означает весь каталог
+        return not self.brands or brand_name in self.brands
+
+
+def load_tenants(path=""):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [Tenant(**item) for item in json.load(f)]
+
+    operators_str = os.getenv("OPERATORS", DEFAULT_OPERATORS)
+    return [Tenant(
+        name="default",
+        token=os.getenv("BOT_TOKEN", DEFAULT_BOT_TOKEN),
+        operators=[op.strip() for op in operators_str.split(",") if op.strip()],
+        files_channel_id=os.getenv("FILES_CHANNEL_ID", DEFAULT_FILES_CHANNEL_ID),
+        log_channel_id=os.getenv("LOG_CHANNEL_ID", DEFAULT_LOG_CHANNEL_ID)
+    )]